@@ -0,0 +1,75 @@
+import azure.functions as func
+import os
+import uuid
+import orjson
+
+from ..shared_code import blob_store
+from ..shared_code.http_responses import internal_error_response, json_response
+from ..shared_code.settings import get_logger
+
+logger = get_logger("get_upload_url")
+
+# Only image uploads are handed a write URL; the blob is stored with the matching type
+IMAGE_CONTENT_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".bmp": "image/bmp",
+}
+
+# -----------------------
+# Pre-serialized response bodies (built once per worker)
+# -----------------------
+ERR_NO_FILENAME = orjson.dumps({"error": "no_filename", "detail": "expecting 'filename' in the JSON body"})
+ERR_BAD_EXTENSION = orjson.dumps({"error": "invalid_image", "detail": "filename must have an image extension"})
+ERR_SAS_UNAVAILABLE = orjson.dumps({"error": "upload_url_unavailable", "detail": "direct uploads are not configured"})
+
+
+def requested_filename(req: func.HttpRequest) -> str:
+    """The 'filename' from the JSON body (or the query string, for older clients)."""
+    try:
+        body = req.get_json()
+    except ValueError:
+        body = None
+    filename = body.get("filename") if isinstance(body, dict) else None
+    if not isinstance(filename, str):
+        filename = req.params.get("filename")
+    return os.path.basename(filename or "")
+
+
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Hand the client a short-lived write SAS so it can PUT the image straight to Blob.
+    The image bytes never pass through the Function.
+    """
+    if not blob_store.BLOB_SAS_ENABLED:
+        return json_response(ERR_SAS_UNAVAILABLE, 503)
+
+    try:
+        filename = requested_filename(req)
+        if not filename:
+            return json_response(ERR_NO_FILENAME, 400)
+        content_type = IMAGE_CONTENT_TYPES.get(os.path.splitext(filename)[1].lower())
+        if content_type is None:
+            return json_response(ERR_BAD_EXTENSION, 400)
+
+        container_client = blob_store.get_container_client()
+        await blob_store.ensure_container(container_client)
+
+        # Unique prefix so concurrent clients never overwrite each other
+        blob_name = f"{uuid.uuid4().hex}_{filename}"
+        upload_url, expiry = blob_store.write_sas_url(container_client, blob_name)
+        logger.info("🔑 Issued upload URL for %s", blob_name)
+
+        return json_response(orjson.dumps({
+            "blob_name": blob_name,
+            "blob_url": blob_store.blob_url_for(container_client, blob_name),
+            "upload_url": upload_url,
+            "upload_headers": {"x-ms-blob-type": "BlockBlob", "x-ms-blob-content-type": content_type},
+            "expires_at": expiry
+        }))
+
+    except Exception:
+        return internal_error_response(logger, "Get_upload_url")
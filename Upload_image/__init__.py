@@ -1,43 +1,120 @@
-import logging
 import azure.functions as func
-from azure.storage.blob import BlobServiceClient, ContentSettings
-from pymongo import MongoClient
-import requests
+import asyncio
 import os
 import time
-from datetime import datetime
-import traceback
-import json
-from mimetypes import guess_type
-import imghdr
+import uuid
+import orjson
+from datetime import datetime, timezone
+
+from ..shared_code import blob_store
+from ..shared_code.http_responses import internal_error_response, json_response
+from ..shared_code.settings import UPLOAD_FANOUT, env_flag, get_logger
+
+logger = get_logger("upload_image")
+
 
 # -----------------------
-# Logging setup
+# Optional pipeline stages (modules are imported only when enabled)
 # -----------------------
-logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
-logger = logging.getLogger("upload_image")
+ENABLE_MONGO = env_flag("ENABLE_MONGO")
+ENABLE_YOLO_TRIGGER = env_flag("ENABLE_YOLO_TRIGGER")
+if ENABLE_YOLO_TRIGGER and not blob_store.BLOB_SAS_ENABLED:
+    # YOLO reads the blobs through SAS URLs, which can't be signed without the account key
+    logger.warning("⚠️ ENABLE_YOLO_TRIGGER ignored: SAS signing is unavailable for this connection string.")
+    ENABLE_YOLO_TRIGGER = False
+if ENABLE_YOLO_TRIGGER:
+    from ..shared_code import inference_trigger
+    if not inference_trigger.YOLO_ENDPOINT:
+        # Nothing to send to, so don't sign SAS URLs or report inference as queued
+        logger.warning("⚠️ ENABLE_YOLO_TRIGGER ignored: YOLO_ENDPOINT is not configured.")
+        ENABLE_YOLO_TRIGGER = False
+
+logger.info(
+    "🌍 ENV: blob_container=%s, ENABLE_MONGO=%s, ENABLE_YOLO_TRIGGER=%s",
+    blob_store.BLOB_CONTAINER_NAME, ENABLE_MONGO, ENABLE_YOLO_TRIGGER
+)
+
+
+# -----------------------
+# Pre-serialized response bodies (built once per worker)
+# -----------------------
+ERR_NO_FILE = orjson.dumps({"error": "no_file", "detail": "expecting form field 'file'"})
+ERR_NOT_IMAGE = orjson.dumps({"error": "invalid_image", "detail": "file is not a supported image"})
+
+
+# Magic-byte signatures checked against the first bytes of the upload
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+SNIFF_BYTES = 12
 
 
-def detect_image_content_type(filename: str, data: bytes) -> str:
+def sniff_image_type(head: bytes):
+    """Return the MIME type implied by the file signature, or None if unrecognised."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+
+def detect_image_content_type(head: bytes):
     """
-    Robust MIME detection:
-    1️⃣ Try Python mimetypes (by file extension)
-    2️⃣ Fallback to imghdr (actual bytes)
-    3️⃣ Default to image/jpeg if still unknown
+    MIME type for an upload, taken from its magic bytes (first SNIFF_BYTES).
+    The filename extension is not trusted: a PNG named x.jpg is stored as image/png.
+    Returns None if the bytes are not a supported image.
     """
-    detected_type, _ = guess_type(filename)
-    if detected_type and detected_type.startswith("image/"):
-        return detected_type
+    return sniff_image_type(head)
+
+
+async def process_upload(container_client, file, content_type: str, semaphore: asyncio.Semaphore) -> dict:
+    """Upload one multipart file and queue its metadata for MongoDB."""
+    from azure.storage.blob import ContentSettings
+    async with semaphore:
+        # Keep the upload as a stream; only its size is measured here
+        image_stream = file.stream
+        image_name = os.path.basename(file.filename or "")
+        # Unique prefix so same-named files (in one request or across requests) never collide
+        blob_name = f"{uuid.uuid4().hex}_{image_name}"
+        image_stream.seek(0, os.SEEK_END)
+        image_size = image_stream.tell()
+        image_stream.seek(0)
+        logger.info("📁 Received file: %s (%.1f KB)", image_name, image_size / 1024)
+        logger.info("🖼️ Detected content type for blob: %s", content_type)
+
+        await container_client.upload_blob(
+            name=blob_name,
+            data=image_stream,
+            length=image_size,
+            overwrite=True,
+            max_concurrency=blob_store.BLOB_MAX_CONCURRENCY,
+            content_settings=ContentSettings(content_type=content_type)
+        )
+
+        blob_url = blob_store.blob_url_for(container_client, blob_name)
+        logger.info("✅ Uploaded to Blob: %s", blob_url)
 
-    # Fallback: detect from bytes
-    kind = imghdr.what(None, data)
-    if kind:
-        return f"image/{kind}"
+        if ENABLE_MONGO:
+            from ..shared_code import metadata_log
+            metadata_log.queue_metadata({
+                "filename": image_name,
+                "blob_name": blob_name,
+                "blob_url": blob_url,
+                "upload_time": datetime.now(timezone.utc),
+                "ts_ns": time.time_ns(),  # sub-second ordering within the same upload_time
+                "content_type": content_type,
+                "status": "uploaded"
+            })
 
-    return "image/jpeg"
+        return {"filename": image_name, "blob_name": blob_name, "blob_url": blob_url}
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     start_time = time.time()
     logger.info("🔵 [START] Upload_image function triggered")
 
@@ -45,129 +122,68 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         # -----------------------
         # Validate multipart form upload
         # -----------------------
-        file = req.files.get('file')
-        if not file:
+        files = req.files.getlist('file')
+        if not files:
             logger.error("❌ No file found in request (expecting form field 'file').")
-            return func.HttpResponse("No file uploaded", status_code=400)
-
-        image_bytes = file.stream.read()
-        image_name = file.filename
-        size_kb = round(len(image_bytes) / 1024, 1)
-        logger.info(f"📁 Received file: {image_name} ({size_kb} KB)")
+            return json_response(ERR_NO_FILE, 400)
+
+        # Sniff only the header bytes and reject non-images before anything is uploaded
+        content_types = []
+        for f in files:
+            head = f.stream.read(SNIFF_BYTES)
+            f.stream.seek(0)
+            content_type = detect_image_content_type(head)
+            if content_type is None:
+                logger.warning("⚠️ Rejected %s: not a recognised image", f.filename)
+                return json_response(ERR_NOT_IMAGE, 400)
+            content_types.append(content_type)
 
         # -----------------------
-        # Load environment variables
+        # Upload every file concurrently (bounded fan-out)
         # -----------------------
-        blob_conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-        blob_container = os.getenv("BLOB_CONTAINER_NAME", "uploads")
-        mongo_uri = os.getenv("MONGO_URI")
-        mongo_db_name = os.getenv("MONGO_DB", "yolov11db")
-        mongo_collection = os.getenv("MONGO_COLLECTION", "yolov11-collection")
-        yolo_endpoint = os.getenv("YOLO_ENDPOINT")  # e.g. https://yolov11-app.centralindia.azurecontainerapps.io
-
-        if not blob_conn_str:
-            raise ValueError("Missing AZURE_STORAGE_CONNECTION_STRING")
+        container_client = blob_store.get_container_client()
+        await blob_store.ensure_container(container_client)
 
-        logger.info(f"🌍 ENV: blob_container={blob_container}, YOLO_ENDPOINT={yolo_endpoint or 'MISSING'}")
+        semaphore = asyncio.Semaphore(UPLOAD_FANOUT)
+        uploads = await asyncio.gather(
+            *(process_upload(container_client, f, ct, semaphore) for f, ct in zip(files, content_types))
+        )
 
         # -----------------------
-        # Upload to Azure Blob with correct Content-Type
+        # Post-upload steps. The blobs are already stored, so a failure here
+        # is logged and the upload result still goes back to the client.
         # -----------------------
-        blob_service = BlobServiceClient.from_connection_string(blob_conn_str)
-        container_client = blob_service.get_container_client(blob_container)
-
-        # Create container if needed
+        inference_queued = False
         try:
-            container_client.create_container()
+            # Queue YOLO inference (one batched call for multi-file requests).
+            # YOLO pulls the image from Blob itself via a read-only SAS URL;
+            # the response does not wait for it
+            if ENABLE_YOLO_TRIGGER:
+                from ..shared_code import inference_trigger
+                inference_trigger.queue_inference(
+                    [blob_store.read_sas_url(container_client, u["blob_name"]) for u in uploads]
+                )
+                inference_queued = True
+
+            # Per-blob read SAS URLs for the caller are opt-in (x-want-sas: 1)
+            if req.headers.get("x-want-sas") == "1" and blob_store.BLOB_SAS_ENABLED:
+                for u in uploads:
+                    u["sas_url"] = blob_store.caller_read_sas_url(container_client, u["blob_name"])
         except Exception:
-            pass  # Already exists
+            logger.exception("⚠️ Post-upload step failed; returning the upload result without it")
 
-        content_type = detect_image_content_type(image_name, image_bytes)
-        logger.info(f"🖼️ Detected content type for blob: {content_type}")
+        logger.info("🏁 Upload_image completed in %.2fs", time.time() - start_time)
 
-        container_client.upload_blob(
-            name=image_name,
-            data=image_bytes,
-            overwrite=True,
-            content_settings=ContentSettings(content_type=content_type)
-        )
-
-        blob_url = f"{container_client.url}/{image_name}"
-        logger.info(f"✅ Uploaded to Blob: {blob_url}")
-
-        # -----------------------
-        # Save metadata to MongoDB (optional)
-        # -----------------------
-        if mongo_uri:
-            try:
-                client = MongoClient(mongo_uri, tls=True, tlsAllowInvalidCertificates=True)
-                db = client[mongo_db_name]
-                coll = db[mongo_collection]
-                doc = {
-                    "filename": image_name,
-                    "blob_url": blob_url,
-                    "upload_time": datetime.utcnow(),
-                    "content_type": content_type,
-                    "status": "uploaded"
-                }
-                coll.insert_one(doc)
-                logger.info("✅ Inserted metadata into MongoDB.")
-            except Exception as mongo_err:
-                logger.error(f"⚠️ MongoDB insert failed: {mongo_err}")
-                logger.debug(traceback.format_exc())
+        # Single-file requests keep the original response shape
+        if len(uploads) == 1:
+            body = {"status": "success", "blob_url": uploads[0]["blob_url"]}
+            if "sas_url" in uploads[0]:
+                body["sas_url"] = uploads[0]["sas_url"]
         else:
-            logger.warning("⚠️ MONGO_URI not set — skipping Mongo logging.")
+            body = {"status": "success", "uploads": uploads}
+        if inference_queued:
+            body["inference"] = "queued"
+        return json_response(orjson.dumps(body))
 
-        # -----------------------
-        # Trigger YOLO inference
-        # -----------------------
-        if yolo_endpoint:
-            payload = {"blob_url": blob_url}
-            headers = {"Content-Type": "application/json"}
-            success = False
-
-            for attempt in range(1, 4):
-                try:
-                    logger.info(f"🚀 Sending inference request (attempt {attempt}) → {yolo_endpoint}/infer")
-                    response = requests.post(
-                        f"{yolo_endpoint}/infer",
-                        json=payload,  # ensures proper JSON body
-                        headers=headers,
-                        timeout=30
-                    )
-                    logger.info(f"📨 Status: {response.status_code}")
-                    logger.debug(f"Response: {response.text[:400]}")
-
-                    if response.status_code == 200:
-                        success = True
-                        logger.info("✅ Inference succeeded.")
-                        break
-                    else:
-                        logger.warning(f"⚠️ Inference failed (status {response.status_code}): {response.text}")
-                except Exception as e:
-                    logger.warning(f"⚠️ Inference attempt {attempt} failed: {e}")
-                    logger.debug(traceback.format_exc())
-                    time.sleep(2)
-
-            if not success:
-                logger.error("❌ All inference attempts failed.")
-        else:
-            logger.warning("⚠️ YOLO_ENDPOINT not configured — skipping inference trigger.")
-
-        total_time = round(time.time() - start_time, 2)
-        logger.info(f"🏁 Upload_image completed in {total_time}s")
-
-        return func.HttpResponse(
-            json.dumps({"status": "success", "blob_url": blob_url}),
-            status_code=200,
-            mimetype="application/json"
-        )
-
-    except Exception as ex:
-        logger.error("🔥 Exception in Upload_image function")
-        logger.error(traceback.format_exc())
-        return func.HttpResponse(
-            json.dumps({"error": str(ex)}),
-            status_code=500,
-            mimetype="application/json"
-        )
+    except Exception:
+        return internal_error_response(logger, "Upload_image")
@@ -2,7 +2,6 @@ import streamlit as st
 import requests
 import os
 import logging
-import pdb
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,35 +13,57 @@ if not AZURE_FUNCTION_URL:
     st.error("❌ AZURE_FUNCTION_URL environment variable is not set.")
     st.stop()
 
-st.title("📸 Capture or Upload Image to Azure Blob Storage")
 
-# Let user capture or upload an image
-uploaded_image = st.camera_input("Take a photo") or st.file_uploader("Or choose an image", type=["jpg", "jpeg", "png"])
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """One keep-alive session per Streamlit server, shared across reruns."""
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
 
-if uploaded_image:
-    st.image(uploaded_image, caption="Selected image", width='stretch')
+
+st.title("📸 Capture or Upload Images to Azure Blob Storage")
+
+# Let user capture a photo and/or upload several images
+captured_image = st.camera_input("Take a photo")
+uploaded_images = st.file_uploader("Or choose images", type=["jpg", "jpeg", "png"], accept_multiple_files=True)
+images = ([captured_image] if captured_image else []) + list(uploaded_images or [])
+
+if images:
+    for image in images:
+        st.image(image, caption=image.name, width='stretch')
 
     if st.button("Upload to Azure Blob Storage 🚀"):
-        # Prepare the file
-        files = {'file': (uploaded_image.name, uploaded_image.getvalue(), uploaded_image.type)}
-        headers = {"x-filename": uploaded_image.name}
+        # One multipart request for every image; the Function uploads them concurrently
+        files = [('file', (image.name, image.getvalue(), image.type)) for image in images]
+        headers = {"x-want-sas": "1"}
 
-        with st.spinner("Uploading to Azure..."):
+        with st.spinner(f"Uploading {len(images)} image(s) to Azure..."):
             try:
-                pdb.set_trace() 
-                logger.info(f"Uploading {uploaded_image.name} to Azure Function...")
-                response = requests.post(AZURE_FUNCTION_URL, files=files, headers=headers)
+                logger.info("Uploading %d image(s) to Azure Function...", len(images))
+                response = get_http_session().post(AZURE_FUNCTION_URL, files=files, headers=headers, timeout=120)
 
                 if response.status_code == 200:
                     result = response.json()
-                    st.success(f"✅ Uploaded successfully as {result['blob_name']}")
-                    st.write(f"🌐 Access URL (1-hour SAS link): {result['blob_url']}")
-                    logger.info(f"Upload successful: {result}")
+                    # Single-file responses are flat; multi-file ones list each upload
+                    uploads = result.get("uploads") or [{
+                        "filename": images[0].name,
+                        "blob_url": result["blob_url"],
+                        "sas_url": result.get("sas_url"),
+                    }]
+                    for upload in uploads:
+                        st.success(f"✅ Uploaded {upload['filename']}")
+                        if upload.get("sas_url"):
+                            st.write(f"🌐 Access URL (15-minute SAS link): {upload['sas_url']}")
+                        else:
+                            st.write(f"🌐 Blob URL (no SAS; needs container access): {upload['blob_url']}")
+                    if result.get("inference") == "queued":
+                        st.info("🧠 YOLO inference queued.")
+                    logger.info("Upload successful: %s", [u["blob_url"] for u in uploads])
                 else:
                     st.error(f"❌ Upload failed: {response.text}")
-                    logger.error(f"Upload failed with status {response.status_code}: {response.text}")
+                    logger.error("Upload failed with status %s: %s", response.status_code, response.text)
 
             except Exception as e:
                 st.error(f"⚠️ Error: {e}")
                 logger.exception("Exception occurred during upload")
-
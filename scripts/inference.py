@@ -4,26 +4,52 @@ Tolerant to Content-Type mismatches (e.g. application/octet-stream)
 Saves inference results to Cosmos DB (Mongo API)
 """
 
-from ultralytics import YOLO
+import os
+os.environ.setdefault("YOLO_VERBOSE", "False")  # must be set before ultralytics is imported
+
+# Match BLAS/OpenMP pools to the container's vCPUs (set before numpy/cv2/torch load).
+# TORCH_THREADS only pins the torch/OpenCV/OpenMP pools, i.e. the .pt path. An .onnx
+# MODEL_PATH runs on ONNX Runtime, which ignores all three and sizes its intra-op
+# pool to the physical cores; ultralytics builds that session without SessionOptions.
+INFERENCE_THREADS = int(os.getenv("TORCH_THREADS", "1"))
+os.environ.setdefault("OMP_NUM_THREADS", str(INFERENCE_THREADS))
+
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from pymongo import MongoClient
-from PIL import Image, UnidentifiedImageError
 from bson import ObjectId
-import requests
-import io
-import os
+import aiohttp
+import asyncio
+import cv2
+import numpy as np
 import datetime
-import traceback
+import hashlib
 import json
 import logging
-import imghdr
-import time
+import orjson
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+cv2.setNumThreads(INFERENCE_THREADS)
 
 # -------------------------------------------------------------------
 # App + Logging Setup
 # -------------------------------------------------------------------
-app = FastAPI(title="YOLOv11 Inference Service", version="1.6")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the model before serving (a bad MODEL_PATH fails startup); release resources on shutdown."""
+    await run_in_threadpool(get_model)
+    yield
+    await close_http_session()
+
+app = FastAPI(
+    title="YOLOv11 Inference Service",
+    version="1.6",
+    lifespan=lifespan
+)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,30 +57,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger("yolov11")
 
-def log(msg: str):
-    logger.info(msg)
+def log(msg: str, *args):
+    """INFO log with lazy %-style args (formatted only if the record is emitted)."""
+    logger.info(msg, *args)
 
 # -------------------------------------------------------------------
 # Configurations from Environment
 # -------------------------------------------------------------------
-MODEL_PATH = "/app/models/yolo11n.pt"
+MODEL_PATH = os.getenv("MODEL_PATH", "/app/models/yolo11n.pt")  # .onnx runs on ONNX Runtime
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB = os.getenv("MONGO_DB", "yolov11db")
 MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "yolov11-collection")
+DETECTION_CACHE_SIZE = int(os.getenv("DETECTION_CACHE_SIZE", "256"))  # 0 disables the cache
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", "32"))  # cap on blobs held in memory per /infer_batch
 
 # -------------------------------------------------------------------
-# Load YOLOv11 Model
+# Load YOLOv11 Model (at startup via lifespan, then cached)
 # -------------------------------------------------------------------
-try:
-    log("🔄 Loading YOLOv11 model...")
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-    model = YOLO(MODEL_PATH)
-    log("✅ YOLOv11 model loaded successfully.")
-except Exception as e:
-    log(f"❌ Model load failed: {e}")
-    traceback.print_exc()
-    raise
+@lru_cache(maxsize=1)
+def get_model():
+    """Import ultralytics and load the model once per process."""
+    try:
+        log("🔄 Loading YOLOv11 model...")
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
+        import torch
+        torch.set_num_threads(INFERENCE_THREADS)
+        from ultralytics import YOLO
+        model = YOLO(MODEL_PATH, task="detect")
+        log("✅ YOLOv11 model loaded successfully.")
+        return model
+    except Exception as e:
+        logger.exception("❌ Model load failed: %s", e)
+        raise
+
+_predict_lock = threading.Lock()
+
+def run_predict(source):
+    """Blocking YOLO predict (run via run_in_threadpool); the model instance isn't thread-safe."""
+    with _predict_lock:
+        return get_model().predict(source=source, conf=0.25, verbose=False, save=False)
 
 # -------------------------------------------------------------------
 # Connect to MongoDB (Optional)
@@ -65,14 +107,40 @@ try:
         mc = MongoClient(MONGO_URI, tls=True, tlsAllowInvalidCertificates=True, serverSelectionTimeoutMS=5000)
         db = mc[MONGO_DB]
         collection = db[MONGO_COLLECTION]
-        log(f"✅ MongoDB connected: DB={MONGO_DB}, Collection={MONGO_COLLECTION}")
+        log("✅ MongoDB connected: DB=%s, Collection=%s", MONGO_DB, MONGO_COLLECTION)
     else:
         log("⚠️ MONGO_URI not set — skipping MongoDB logging.")
 except Exception as e:
-    log(f"⚠️ MongoDB connection failed: {e}")
-    traceback.print_exc()
+    log("⚠️ MongoDB connection failed: %s", e)
+    logger.debug("Traceback:", exc_info=True)
     collection = None
 
+# -------------------------------------------------------------------
+# Shared HTTP session for blob downloads (keep-alive across requests)
+# -------------------------------------------------------------------
+_http_session = None
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the process-wide aiohttp session, creating it on first use."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, ttl_dns_cache=300, keepalive_timeout=30)
+        )
+    return _http_session
+
+async def close_http_session():
+    """Close the shared aiohttp session, if one was opened."""
+    if _http_session is not None:
+        await _http_session.close()
+
+# -------------------------------------------------------------------
+# Helper: orjson-encoded JSON response (ORJSONResponse is deprecated in FastAPI)
+# -------------------------------------------------------------------
+def json_response(content, status_code: int = 200) -> Response:
+    """Serialize with orjson and wrap the bytes in a plain Response."""
+    return Response(content=orjson.dumps(content), status_code=status_code, media_type="application/json")
+
 # -------------------------------------------------------------------
 # Helper: Convert ObjectId safely
 # -------------------------------------------------------------------
@@ -95,15 +163,13 @@ async def health():
     return {"status": "ok"}
 
 # -------------------------------------------------------------------
-# Inference Endpoint
+# Request / Image Helpers
 # -------------------------------------------------------------------
-@app.post("/infer")
-async def infer(request: Request):
-    log("📥 Received /infer request")
-
+async def parse_json_body(request: Request) -> dict:
+    """Parse the JSON body, tolerating a wrong or missing Content-Type."""
     # Log request Content-Type
     req_content_type = (request.headers.get("content-type") or "").lower()
-    log(f"📦 Request Content-Type: {req_content_type}")
+    log("📦 Request Content-Type: %s", req_content_type)
 
     # Parse JSON body robustly
     try:
@@ -117,232 +183,107 @@ async def infer(request: Request):
             except Exception:
                 raise HTTPException(status_code=400, detail="Invalid or missing JSON body")
     except Exception as ex:
-        log(f"⚠️ JSON parse error: {ex}")
+        log("⚠️ JSON parse error: %s", ex)
         raise HTTPException(status_code=400, detail="Invalid or missing JSON body")
 
-    # Validate blob_url
-    blob_url = data.get("blob_url")
-    if not blob_url:
-        log("⚠️ Missing blob_url in request")
-        raise HTTPException(status_code=400, detail="Missing blob_url")
+    if not isinstance(data, dict):
+        log("⚠️ JSON body is not an object")
+        raise HTTPException(status_code=400, detail="JSON body must be an object")
+    return data
+
+def strip_sas(blob_url: str) -> str:
+    """Drop the SAS query string so tokens never reach logs or MongoDB."""
+    return blob_url.split("?", 1)[0]
 
-    log(f"🌐 Downloading blob: {blob_url}")
-    image_response = None
+async def download_blob(session: aiohttp.ClientSession, blob_url: str) -> bytes:
+    """Download blob bytes (with retries) and validate the blob Content-Type."""
+    log("🌐 Downloading blob: %s", strip_sas(blob_url))
+    timeout = aiohttp.ClientTimeout(total=20)
 
     # Download image with retries
     for attempt in range(1, 4):
         try:
-            image_response = requests.get(blob_url, timeout=20)
-            image_response.raise_for_status()
+            async with session.get(blob_url, timeout=timeout) as image_response:
+                image_response.raise_for_status()
+                blob_ct = (image_response.headers.get("Content-Type") or "").lower()
+                content = await image_response.read()
             break
         except Exception as ex:
-            log(f"⚠️ Attempt {attempt} to download blob failed: {ex}")
+            # aiohttp errors embed the request URL (and its SAS), so log only the status/type
+            log("⚠️ Attempt %d to download blob failed: %s", attempt, getattr(ex, "status", None) or type(ex).__name__)
             if attempt == 3:
-                raise HTTPException(status_code=500, detail=f"Failed to download blob: {ex}")
-            time.sleep(1)
+                raise HTTPException(status_code=502, detail="Failed to download blob")
+            await asyncio.sleep(1)
 
     # Validate blob content type
-    blob_ct = (image_response.headers.get("Content-Type") or "").lower()
-    log(f"📦 Blob Content-Type: {blob_ct}")
+    log("📦 Blob Content-Type: %s", blob_ct)
 
     if not (("image" in blob_ct) or ("octet-stream" in blob_ct) or (blob_ct == "")):
-        log(f"⚠️ Unacceptable blob Content-Type: {blob_ct}")
+        log("⚠️ Unacceptable blob Content-Type: %s", blob_ct)
         raise HTTPException(status_code=400, detail=f"Invalid blob content type: {blob_ct}")
 
-    # Decode image
-    try:
-        image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-        log(f"✅ Image decoded successfully (size={image.size})")
-    except UnidentifiedImageError:
-        log("⚠️ PIL could not identify image; trying imghdr fallback.")
-        kind = imghdr.what(None, h=image_response.content)
-        if not kind:
-            raise HTTPException(status_code=400, detail="Invalid image data")
-        image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-        log(f"✅ Image decoded via imghdr fallback: type={kind}")
-    except Exception as ex:
-        log(f"❌ Image decode failed: {ex}")
-        raise HTTPException(status_code=400, detail="Failed to decode image")
-
-    # Run YOLO inference
-    try:
-        log("🧠 Running YOLOv11 inference...")
-        results = model.predict(source=image, conf=0.25)
-        log("✅ Inference complete.")
-    except Exception as ex:
-        log(f"❌ Inference failed: {ex}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Inference failed")
-
-    # Extract detections
-    detections = []
-    for r in results:
-        for box in getattr(r, "boxes", []):
-            detections.append({
-                "class": int(box.cls),
-                "confidence": float(box.conf),
-                "bbox": [float(x) for x in box.xyxy[0].tolist()]
-            })
-
-    record = {
-        "blob_url": blob_url,
+    return content
+
+def decode_image(content: bytes) -> np.ndarray:
+    """Decode raw bytes in memory into a BGR array (what YOLO expects)."""
+    image = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        log("❌ Image decode failed: unsupported or corrupt image data")
+        raise HTTPException(status_code=400, detail="Invalid image data")
+    log("✅ Image decoded successfully (shape=%s)", image.shape)
+    return image
+
+def extract_detections(result) -> list:
+    """Flatten one YOLO result into JSON-friendly detection dicts."""
+    boxes = getattr(result, "boxes", None)
+    if boxes is None or len(boxes) == 0:
+        return []
+    # One tensor -> NumPy transfer per field instead of per box
+    cls = boxes.cls.cpu().numpy().astype(int).tolist()
+    conf = boxes.conf.cpu().numpy().tolist()
+    xyxy = boxes.xyxy.cpu().numpy().tolist()
+    return [
+        {"class": c, "confidence": cf, "bbox": b}
+        for c, cf, b in zip(cls, conf, xyxy)
+    ]
+
+# -------------------------------------------------------------------
+# Detection cache (keyed on SHA-256 of the image bytes)
+# -------------------------------------------------------------------
+_detection_cache = OrderedDict()
+
+def cached_detections(digest: bytes):
+    """Return cached detections for an image digest (refreshing its LRU slot), or None."""
+    detections = _detection_cache.get(digest)
+    if detections is not None:
+        _detection_cache.move_to_end(digest)
+    return detections
+
+def cache_detections(digest: bytes, detections: list):
+    """Remember detections for an image digest, evicting the least recently used."""
+    if DETECTION_CACHE_SIZE <= 0:
+        return
+    _detection_cache[digest] = detections
+    _detection_cache.move_to_end(digest)
+    while len(_detection_cache) > DETECTION_CACHE_SIZE:
+        _detection_cache.popitem(last=False)
+
+def build_record(blob_url: str, detections: list) -> dict:
+    """Build the result document stored in MongoDB and returned to the caller."""
+    return {
+        "blob_url": strip_sas(blob_url),
         "detections": detections,
         "total_objects": len(detections),
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z"
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat()
     }
 
-    # Save to MongoDB (best-effort)
-    try:
-        if collection is not None:
-            insert_result = collection.insert_one(record)
-            record["_id"] = insert_result.inserted_id
-            log("✅ Saved inference result to MongoDB.")
-        else:
-            log("⚠️ MongoDB collection not available; skipping save.")
-    except Exception as e:
-        log(f"⚠️ MongoDB insertion failed: {e}")
-        log(traceback.format_exc())
-
-    # Convert any ObjectIds before returning
-    safe_record = to_json_safe(record)
-
-    log("✅ Returning inference result (200 OK).")
-    return JSONResponse(content=safe_record, status_code=200)
-
-# -------------------------------------------------------------------
-# Run locally
-# -------------------------------------------------------------------
-if __name__ == "__main__":
-    import uvicorn
-    log("🚀 Starting YOLOv11 FastAPI app on port 8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
-
-root@yolov11-app--26unxyg-68dd9585fb-zgj6j:/app#                  
-root@yolov11-app--26unxyg-68dd9585fb-zgj6j:/app# 
-root@yolov11-app--26unxyg-68dd9585fb-zgj6j:/app# 
-root@yolov11-app--26unxyg-68dd9585fb-zgj6j:/app# 
-root@yolov11-app--26unxyg-68dd9585fb-zgj6j:/app# cat inference.py 
-"""
-YOLOv11 Inference Service (FastAPI + Uvicorn)
-Tolerant to Content-Type mismatches (e.g. application/octet-stream)
-Saves inference results to Cosmos DB (Mongo API)
-"""
-
-from ultralytics import YOLO
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
-from pymongo import MongoClient
-from PIL import Image, UnidentifiedImageError
-from bson import ObjectId
-import requests
-import io
-import os
-import datetime
-import traceback
-import json
-import logging
-import imghdr
-import time
-
-# -------------------------------------------------------------------
-# App + Logging Setup
-# -------------------------------------------------------------------
-app = FastAPI(title="YOLOv11 Inference Service", version="1.6")
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
-logger = logging.getLogger("yolov11")
-
-def log(msg: str):
-    logger.info(msg)
-
-# -------------------------------------------------------------------
-# Configurations from Environment
-# -------------------------------------------------------------------
-MODEL_PATH = "/app/models/yolo11n.pt"
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB", "yolov11db")
-MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "yolov11-collection")
-
-# -------------------------------------------------------------------
-# Load YOLOv11 Model
-# -------------------------------------------------------------------
-try:
-    log("🔄 Loading YOLOv11 model...")
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model file not found at {MODEL_PATH}")
-    model = YOLO(MODEL_PATH)
-    log("✅ YOLOv11 model loaded successfully.")
-except Exception as e:
-    log(f"❌ Model load failed: {e}")
-    traceback.print_exc()
-    raise
-
-# -------------------------------------------------------------------
-# Connect to MongoDB (Optional)
-# -------------------------------------------------------------------
-collection = None
-try:
-    if MONGO_URI:
-        mc = MongoClient(MONGO_URI, tls=True, tlsAllowInvalidCertificates=True, serverSelectionTimeoutMS=5000)
-        db = mc[MONGO_DB]
-        collection = db[MONGO_COLLECTION]
-        log(f"✅ MongoDB connected: DB={MONGO_DB}, Collection={MONGO_COLLECTION}")
-    else:
-        log("⚠️ MONGO_URI not set — skipping MongoDB logging.")
-except Exception as e:
-    log(f"⚠️ MongoDB connection failed: {e}")
-    traceback.print_exc()
-    collection = None
-
-# -------------------------------------------------------------------
-# Helper: Convert ObjectId safely
-# -------------------------------------------------------------------
-def to_json_safe(obj):
-    """Recursively convert ObjectId and other non-JSON types to strings."""
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    elif isinstance(obj, list):
-        return [to_json_safe(o) for o in obj]
-    elif isinstance(obj, dict):
-        return {k: to_json_safe(v) for k, v in obj.items()}
-    return obj
-
-# -------------------------------------------------------------------
-# Health Check
-# -------------------------------------------------------------------
-@app.get("/")
-async def health():
-    log("🩺 Health check triggered.")
-    return {"status": "ok"}
-
 # -------------------------------------------------------------------
 # Inference Endpoint
 # -------------------------------------------------------------------
 @app.post("/infer")
 async def infer(request: Request):
     log("📥 Received /infer request")
-
-    # Log request Content-Type
-    req_content_type = (request.headers.get("content-type") or "").lower()
-    log(f"📦 Request Content-Type: {req_content_type}")
-
-    # Parse JSON body robustly
-    try:
-        if "application/json" in req_content_type:
-            data = await request.json()
-        else:
-            raw = await request.body()
-            try:
-                data = json.loads(raw.decode("utf-8"))
-                log("⚠️ Parsed JSON manually from non-JSON content-type.")
-            except Exception:
-                raise HTTPException(status_code=400, detail="Invalid or missing JSON body")
-    except Exception as ex:
-        log(f"⚠️ JSON parse error: {ex}")
-        raise HTTPException(status_code=400, detail="Invalid or missing JSON body")
+    data = await parse_json_body(request)
 
     # Validate blob_url
     blob_url = data.get("blob_url")
@@ -350,88 +291,118 @@ async def infer(request: Request):
         log("⚠️ Missing blob_url in request")
         raise HTTPException(status_code=400, detail="Missing blob_url")
 
-    log(f"🌐 Downloading blob: {blob_url}")
-    image_response = None
+    content = await download_blob(get_http_session(), blob_url)
+    digest = hashlib.sha256(content).digest()
 
-    # Download image with retries
-    for attempt in range(1, 4):
+    # Identical image bytes seen recently: reuse the detections
+    detections = cached_detections(digest)
+    if detections is not None:
+        log("♻️ Detection cache hit; skipping inference.")
+    else:
+        image = decode_image(content)
+
+        # Run YOLO inference
         try:
-            image_response = requests.get(blob_url, timeout=20)
-            image_response.raise_for_status()
-            break
+            log("🧠 Running YOLOv11 inference...")
+            results = await run_in_threadpool(run_predict, image)
+            log("✅ Inference complete.")
         except Exception as ex:
-            log(f"⚠️ Attempt {attempt} to download blob failed: {ex}")
-            if attempt == 3:
-                raise HTTPException(status_code=500, detail=f"Failed to download blob: {ex}")
-            time.sleep(1)
-
-    # Validate blob content type
-    blob_ct = (image_response.headers.get("Content-Type") or "").lower()
-    log(f"📦 Blob Content-Type: {blob_ct}")
+            logger.exception("❌ Inference failed: %s", ex)
+            raise HTTPException(status_code=500, detail="Inference failed")
 
-    if not (("image" in blob_ct) or ("octet-stream" in blob_ct) or (blob_ct == "")):
-        log(f"⚠️ Unacceptable blob Content-Type: {blob_ct}")
-        raise HTTPException(status_code=400, detail=f"Invalid blob content type: {blob_ct}")
+        # Extract detections
+        detections = [d for r in results for d in extract_detections(r)]
+        cache_detections(digest, detections)
 
-    # Decode image
-    try:
-        image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-        log(f"✅ Image decoded successfully (size={image.size})")
-    except UnidentifiedImageError:
-        log("⚠️ PIL could not identify image; trying imghdr fallback.")
-        kind = imghdr.what(None, h=image_response.content)
-        if not kind:
-            raise HTTPException(status_code=400, detail="Invalid image data")
-        image = Image.open(io.BytesIO(image_response.content)).convert("RGB")
-        log(f"✅ Image decoded via imghdr fallback: type={kind}")
-    except Exception as ex:
-        log(f"❌ Image decode failed: {ex}")
-        raise HTTPException(status_code=400, detail="Failed to decode image")
-
-    # Run YOLO inference
-    try:
-        log("🧠 Running YOLOv11 inference...")
-        results = model.predict(source=image, conf=0.25)
-        log("✅ Inference complete.")
-    except Exception as ex:
-        log(f"❌ Inference failed: {ex}")
-        traceback.print_exc()
-        raise HTTPException(status_code=500, detail="Inference failed")
-
-    # Extract detections
-    detections = []
-    for r in results:
-        for box in getattr(r, "boxes", []):
-            detections.append({
-                "class": int(box.cls),
-                "confidence": float(box.conf),
-                "bbox": [float(x) for x in box.xyxy[0].tolist()]
-            })
-
-    record = {
-        "blob_url": blob_url,
-        "detections": detections,
-        "total_objects": len(detections),
-        "timestamp": datetime.datetime.utcnow().isoformat() + "Z"
-    }
+    record = build_record(blob_url, detections)
 
     # Save to MongoDB (best-effort)
     try:
         if collection is not None:
-            insert_result = collection.insert_one(record)
+            insert_result = await run_in_threadpool(collection.insert_one, record)
             record["_id"] = insert_result.inserted_id
             log("✅ Saved inference result to MongoDB.")
         else:
             log("⚠️ MongoDB collection not available; skipping save.")
     except Exception as e:
-        log(f"⚠️ MongoDB insertion failed: {e}")
-        log(traceback.format_exc())
+        log("⚠️ MongoDB insertion failed: %s", e)
+        logger.debug("Traceback:", exc_info=True)
 
     # Convert any ObjectIds before returning
     safe_record = to_json_safe(record)
 
     log("✅ Returning inference result (200 OK).")
-    return JSONResponse(content=safe_record, status_code=200)
+    return json_response(safe_record)
+
+# -------------------------------------------------------------------
+# Batch Inference Endpoint
+# -------------------------------------------------------------------
+@app.post("/infer_batch")
+async def infer_batch(request: Request):
+    log("📥 Received /infer_batch request")
+    data = await parse_json_body(request)
+
+    # Validate items: [{"blob_url": ...}, ...]
+    items = data.get("items") or []
+    if not isinstance(items, list):
+        log("⚠️ items is not a list in batch request")
+        raise HTTPException(status_code=400, detail="items must be a list")
+    if len(items) > MAX_BATCH_ITEMS:
+        log("⚠️ Batch of %d items exceeds MAX_BATCH_ITEMS=%d", len(items), MAX_BATCH_ITEMS)
+        raise HTTPException(status_code=413, detail=f"Too many items (max {MAX_BATCH_ITEMS})")
+    blob_urls = [item.get("blob_url") for item in items if isinstance(item, dict)]
+    if not blob_urls or len(blob_urls) != len(items) or not all(blob_urls):
+        log("⚠️ Missing or invalid items in batch request")
+        raise HTTPException(status_code=400, detail="Missing blob_url in items")
+
+    # Fetch every blob concurrently; wall-clock is ~one download, not N
+    session = get_http_session()
+    contents = await asyncio.gather(*(download_blob(session, url) for url in blob_urls))
+    digests = [hashlib.sha256(c).digest() for c in contents]
+
+    # Only images not in the detection cache go through YOLO
+    detections = [cached_detections(d) for d in digests]
+    # Group misses by digest so identical images in one batch share a single prediction
+    misses = OrderedDict()
+    for i, dets in enumerate(detections):
+        if dets is None:
+            misses.setdefault(digests[i], []).append(i)
+
+    if misses:
+        images = [decode_image(contents[indices[0]]) for indices in misses.values()]
+
+        # Run all uncached images through YOLO as one batched forward pass
+        try:
+            log("🧠 Running YOLOv11 batch inference on %d images...", len(images))
+            results = await run_in_threadpool(run_predict, images)
+            log("✅ Batch inference complete.")
+        except Exception as ex:
+            logger.exception("❌ Batch inference failed: %s", ex)
+            raise HTTPException(status_code=500, detail="Inference failed")
+
+        for (digest, indices), r in zip(misses.items(), results):
+            dets = extract_detections(r)
+            cache_detections(digest, dets)
+            for i in indices:
+                detections[i] = dets
+    missed = sum(len(indices) for indices in misses.values())
+    log("♻️ Detection cache hits: %d/%d (%d unique images inferred)", len(blob_urls) - missed, len(blob_urls), len(misses))
+
+    records = [build_record(url, dets) for url, dets in zip(blob_urls, detections)]
+
+    # Save to MongoDB (best-effort, one round-trip for the whole batch)
+    try:
+        if collection is not None:
+            await run_in_threadpool(collection.insert_many, records)
+            log("✅ Saved %d inference results to MongoDB.", len(records))
+        else:
+            log("⚠️ MongoDB collection not available; skipping save.")
+    except Exception as e:
+        log("⚠️ MongoDB insertion failed: %s", e)
+        logger.debug("Traceback:", exc_info=True)
+
+    log("✅ Returning batch inference results (200 OK).")
+    return json_response({"results": to_json_safe(records)})
 
 # -------------------------------------------------------------------
 # Run locally
@@ -440,4 +411,3 @@ if __name__ == "__main__":
     import uvicorn
     log("🚀 Starting YOLOv11 FastAPI app on port 8000")
     uvicorn.run(app, host="0.0.0.0", port=8000)
-
@@ -0,0 +1,167 @@
+"""
+Shared Azure Blob Storage access for the Function app.
+One aio BlobServiceClient (and its connection pool) per worker process.
+The Azure SDK and aiohttp are imported on first use, not at worker start-up.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import quote
+
+from .settings import UPLOAD_FANOUT, env_flag, get_logger
+
+logger = get_logger("blob_store")
+
+# -----------------------
+# Configuration (read once per worker, validated at import)
+# -----------------------
+AZURE_STORAGE_CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+BLOB_CONTAINER_NAME = os.getenv("BLOB_CONTAINER_NAME", "uploads")
+# Set when the container is provisioned out of band (IaC) to skip the create call entirely
+AZURE_CONTAINER_ASSUMED_EXISTS = env_flag("AZURE_CONTAINER_ASSUMED_EXISTS", "0")
+
+if not AZURE_STORAGE_CONNECTION_STRING:
+    raise RuntimeError("Missing AZURE_STORAGE_CONNECTION_STRING")
+
+# SAS signing needs the account key; SAS-token or AAD connection strings don't carry one
+_ACCOUNT_KEY = dict(
+    part.split("=", 1) for part in AZURE_STORAGE_CONNECTION_STRING.split(";") if "=" in part
+).get("AccountKey")
+BLOB_SAS_ENABLED = bool(_ACCOUNT_KEY)
+if not BLOB_SAS_ENABLED:
+    logger.warning("⚠️ Connection string has no AccountKey — SAS URLs (YOLO trigger, upload URLs) are disabled.")
+
+# Upload tuning (overridable per deployment)
+BLOB_MAX_SINGLE_PUT_SIZE = int(os.getenv("BLOB_MAX_SINGLE_PUT_SIZE", 8 * 1024 * 1024))  # larger blobs use blocks
+BLOB_MAX_BLOCK_SIZE = int(os.getenv("BLOB_MAX_BLOCK_SIZE", 8 * 1024 * 1024))
+BLOB_MAX_CONCURRENCY = int(os.getenv("BLOB_MAX_CONCURRENCY", "8"))  # parallel PUT-block calls per upload
+# Enough sockets for every concurrent file to run all of its block PUTs at once
+BLOB_CONNECTION_POOL_SIZE = int(os.getenv(
+    "BLOB_CONNECTION_POOL_SIZE", UPLOAD_FANOUT * BLOB_MAX_CONCURRENCY
+))
+BLOB_READ_SAS_MINUTES = 60          # lifetime of the container read SAS handed to the YOLO service
+BLOB_READ_SAS_REFRESH_MINUTES = 5   # regenerate this long before the cached SAS expires
+BLOB_WRITE_SAS_MINUTES = 10         # lifetime of a direct-upload (create/write) SAS
+BLOB_CALLER_SAS_MINUTES = 15        # lifetime of the per-blob read SAS returned to callers
+
+_ensured_containers = set()
+_read_sas_cache = {}   # container name -> (sas token, expiry)
+
+
+@lru_cache(maxsize=1)
+def get_blob_service():
+    """Return the worker-wide aio BlobServiceClient (built on first call, then cached)."""
+    import aiohttp
+    from azure.core.pipeline.transport import AioHttpTransport
+    from azure.storage.blob.aio import BlobServiceClient
+
+    transport = AioHttpTransport(
+        session=aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=BLOB_CONNECTION_POOL_SIZE)
+        ),
+        session_owner=False
+    )
+    return BlobServiceClient.from_connection_string(
+        AZURE_STORAGE_CONNECTION_STRING,
+        max_single_put_size=BLOB_MAX_SINGLE_PUT_SIZE,
+        max_block_size=BLOB_MAX_BLOCK_SIZE,
+        connection_timeout=20,
+        transport=transport
+    )
+
+
+@lru_cache(maxsize=8)
+def get_container_client(name: str = BLOB_CONTAINER_NAME):
+    """Return a cached ContainerClient on the shared service client."""
+    return get_blob_service().get_container_client(name)
+
+
+@lru_cache(maxsize=8)
+def container_url(name: str = BLOB_CONTAINER_NAME) -> str:
+    """Base URL for blobs in the container, built once per worker."""
+    return get_container_client(name).url
+
+
+def blob_url_for(container_client, blob_name: str) -> str:
+    """Plain URL for a blob; the name is percent-encoded so '#', '?' or '%' can't corrupt it."""
+    return f"{container_url(container_client.container_name)}/{quote(blob_name)}"
+
+
+async def ensure_container(container_client) -> None:
+    """Create the container on first use in this worker; afterwards this is a set lookup."""
+    name = container_client.container_name
+    if AZURE_CONTAINER_ASSUMED_EXISTS or name in _ensured_containers:
+        return
+    from azure.core.exceptions import ResourceExistsError
+    try:
+        await container_client.create_container()
+        logger.info("📦 Created blob container: %s", name)
+    except ResourceExistsError:
+        pass  # Already exists
+    _ensured_containers.add(name)
+
+
+def _require_account_key() -> str:
+    """Return the account key for SAS signing; callers check BLOB_SAS_ENABLED first."""
+    if not _ACCOUNT_KEY:
+        raise RuntimeError("SAS signing requires an AccountKey connection string")
+    return _ACCOUNT_KEY
+
+
+def container_read_sas(container_client) -> str:
+    """Return a read-only container SAS, regenerated only when close to expiry."""
+    name = container_client.container_name
+    now = datetime.now(timezone.utc)
+    cached = _read_sas_cache.get(name)
+    if cached and now + timedelta(minutes=BLOB_READ_SAS_REFRESH_MINUTES) < cached[1]:
+        return cached[0]
+
+    from azure.storage.blob import ContainerSasPermissions, generate_container_sas
+    expiry = now + timedelta(minutes=BLOB_READ_SAS_MINUTES)
+    sas = generate_container_sas(
+        account_name=container_client.account_name,
+        container_name=name,
+        account_key=_require_account_key(),
+        permission=ContainerSasPermissions(read=True),
+        expiry=expiry
+    )
+    _read_sas_cache[name] = (sas, expiry)
+    return sas
+
+
+def read_sas_url(container_client, blob_name: str) -> str:
+    """
+    Return a read URL for one blob, signed with the cached container SAS.
+    The token reads the whole container, so it is only for the YOLO trigger.
+    """
+    return f"{blob_url_for(container_client, blob_name)}?{container_read_sas(container_client)}"
+
+
+def write_sas_url(container_client, blob_name: str):
+    """Return (url, expiry) for a create/write SAS scoped to a single blob."""
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+    expiry = datetime.now(timezone.utc) + timedelta(minutes=BLOB_WRITE_SAS_MINUTES)
+    sas = generate_blob_sas(
+        account_name=container_client.account_name,
+        container_name=container_client.container_name,
+        blob_name=blob_name,
+        account_key=_require_account_key(),
+        permission=BlobSasPermissions(create=True, write=True),
+        expiry=expiry
+    )
+    return f"{blob_url_for(container_client, blob_name)}?{sas}", expiry
+
+
+def caller_read_sas_url(container_client, blob_name: str) -> str:
+    """Return a short-lived read SAS URL scoped to a single blob, safe to hand to callers."""
+    from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+    sas = generate_blob_sas(
+        account_name=container_client.account_name,
+        container_name=container_client.container_name,
+        blob_name=blob_name,
+        account_key=_require_account_key(),
+        permission=BlobSasPermissions(read=True),
+        expiry=datetime.now(timezone.utc) + timedelta(minutes=BLOB_CALLER_SAS_MINUTES)
+    )
+    return f"{blob_url_for(container_client, blob_name)}?{sas}"
@@ -0,0 +1,23 @@
+"""
+JSON HttpResponse helpers shared by the HTTP-triggered functions.
+"""
+
+import logging
+import uuid
+import azure.functions as func
+import orjson
+
+
+def json_response(body: bytes, status_code: int = 200) -> func.HttpResponse:
+    """Wrap an already-serialized JSON body in an HttpResponse."""
+    return func.HttpResponse(body=body, status_code=status_code, mimetype="application/json")
+
+
+def internal_error_response(logger: logging.Logger, function_name: str) -> func.HttpResponse:
+    """
+    Log the exception being handled under a fresh error id and return an opaque 500.
+    The full traceback stays in the logs; the client only gets the id to quote.
+    """
+    error_id = uuid.uuid4().hex
+    logger.exception("🔥 Exception in %s function (error_id=%s)", function_name, error_id)
+    return json_response(orjson.dumps({"error": "internal_error", "error_id": error_id}), 500)
@@ -0,0 +1,116 @@
+"""
+Fire the YOLO inference service for uploaded blobs.
+Uses one keep-alive aiohttp session per worker with jittered retries.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import aiohttp
+
+from .settings import get_logger
+
+logger = get_logger("inference_trigger")
+
+YOLO_ENDPOINT = (os.getenv("YOLO_ENDPOINT") or "").rstrip("/")  # e.g. https://yolov11-app.centralindia.azurecontainerapps.io
+INFER_URL = f"{YOLO_ENDPOINT}/infer"
+INFER_BATCH_URL = f"{YOLO_ENDPOINT}/infer_batch"
+
+INFERENCE_MAX_ATTEMPTS = 4
+INFERENCE_RETRY_STATUSES = {429, 502, 503, 504}
+INFERENCE_BACKOFF = 0.25        # seconds; backoff cap doubles after each failed attempt
+INFERENCE_BACKOFF_MAX = 10      # seconds; upper bound for the jittered backoff
+INFERENCE_RETRY_AFTER_MAX = 30  # seconds; longest server-requested Retry-After we honour
+INFERENCE_TIMEOUT = 25          # seconds for a single-image /infer call
+INFERENCE_BATCH_TIMEOUT = 120   # seconds for an /infer_batch call
+INFERENCE_BATCH_MAX = int(os.getenv("INFERENCE_BATCH_MAX", "32"))  # keep <= the service's MAX_BATCH_ITEMS
+
+INFER_TIMEOUT = aiohttp.ClientTimeout(total=INFERENCE_TIMEOUT)
+INFER_BATCH_TIMEOUT = aiohttp.ClientTimeout(total=INFERENCE_BATCH_TIMEOUT)
+
+_http_session = None
+_pending = set()   # strong refs so queued triggers aren't garbage-collected mid-flight
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the module-level aiohttp session, creating it on first use."""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=30)
+        )
+    return _http_session
+
+
+def retry_after_seconds(value):
+    """Parse a delta-seconds Retry-After header, clamped to [1, INFERENCE_RETRY_AFTER_MAX]."""
+    try:
+        return min(max(float(value), 1.0), INFERENCE_RETRY_AFTER_MAX)
+    except (TypeError, ValueError):
+        return None
+
+
+async def trigger_inference(blob_urls: list) -> None:
+    """
+    POST the blob URLs to the YOLO service, retrying on failure.
+    One URL goes to /infer; several go to /infer_batch in a single request.
+    """
+    if not YOLO_ENDPOINT:
+        logger.warning("⚠️ YOLO_ENDPOINT not configured — skipping inference trigger.")
+        return
+
+    if len(blob_urls) == 1:
+        url = INFER_URL
+        payload = {"blob_url": blob_urls[0]}
+        timeout = INFER_TIMEOUT
+    else:
+        url = INFER_BATCH_URL
+        payload = {"items": [{"blob_url": u} for u in blob_urls]}
+        timeout = INFER_BATCH_TIMEOUT
+    session = get_http_session()
+
+    for attempt in range(1, INFERENCE_MAX_ATTEMPTS + 1):
+        retry_after = None
+        try:
+            logger.info("🚀 Sending inference request (attempt %d) → %s", attempt, url)
+            async with session.post(
+                url,
+                json=payload,  # ensures proper JSON body
+                timeout=timeout
+            ) as response:
+                response_text = await response.text()
+            logger.info("📨 Status: %s", response.status)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Response: %s", response_text[:400])
+
+            if response.status == 200:
+                logger.info("✅ Inference succeeded.")
+                return
+            logger.warning("⚠️ Inference failed (status %s): %s", response.status, response_text[:400])
+            if response.status not in INFERENCE_RETRY_STATUSES:
+                break
+            # 429/503 may tell us exactly how long to back off
+            retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+        except Exception as e:
+            logger.warning("⚠️ Inference attempt %d failed: %s", attempt, e)
+            logger.debug("Traceback:", exc_info=True)
+
+        if attempt < INFERENCE_MAX_ATTEMPTS:
+            if retry_after is not None:
+                await asyncio.sleep(retry_after)
+            else:
+                # Full jitter keeps concurrent invocations from retrying in lockstep
+                cap = min(INFERENCE_BACKOFF * 2 ** (attempt - 1), INFERENCE_BACKOFF_MAX)
+                await asyncio.sleep(random.uniform(0, cap))
+
+    logger.error("❌ All inference attempts failed.")
+
+
+def queue_inference(blob_urls: list) -> None:
+    """Run trigger_inference in the background so the HTTP response isn't held on YOLO."""
+    # Split large uploads so no single /infer_batch call exceeds the service's cap
+    for i in range(0, len(blob_urls), INFERENCE_BATCH_MAX):
+        task = asyncio.create_task(trigger_inference(blob_urls[i:i + INFERENCE_BATCH_MAX]))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
@@ -0,0 +1,107 @@
+"""
+Best-effort upload metadata logging to MongoDB (Cosmos DB Mongo API).
+Docs are queued per request and written in batches by a background task.
+"""
+
+import asyncio
+import atexit
+import os
+from functools import lru_cache
+
+from .settings import get_logger
+
+logger = get_logger("metadata_log")
+
+MONGO_URI = os.getenv("MONGO_URI")
+MONGO_DB = os.getenv("MONGO_DB", "yolov11db")
+MONGO_COLLECTION = os.getenv("MONGO_COLLECTION", "yolov11-collection")
+
+METADATA_FLUSH_INTERVAL = 5     # seconds between flushes
+METADATA_FLUSH_BATCH = 500      # flush early once this many docs are queued
+METADATA_QUEUE_MAX = 10000      # beyond this, new docs are dropped rather than buffered
+
+_metadata_queue = None
+_metadata_flusher = None
+_metadata_batch = []   # docs taken off the queue but not yet sent
+
+
+@lru_cache(maxsize=1)
+def get_mongo_client():
+    """Return the worker-wide Mongo client (built on first call, then cached)."""
+    # Imported here so workers without MONGO_URI never load motor/pymongo
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(
+        MONGO_URI,
+        maxPoolSize=50,
+        tls=True,
+        tlsAllowInvalidCertificates=True
+    )
+
+
+def queue_metadata(doc: dict) -> None:
+    """Queue the upload metadata for the background Mongo flusher (non-blocking)."""
+    global _metadata_queue, _metadata_flusher
+    if not MONGO_URI:
+        logger.warning("⚠️ MONGO_URI not set — skipping Mongo logging.")
+        return
+
+    if _metadata_queue is None:
+        _metadata_queue = asyncio.Queue(maxsize=METADATA_QUEUE_MAX)
+    if _metadata_flusher is None or _metadata_flusher.done():
+        from pymongo import WriteConcern
+        # Unacknowledged writes: metadata is telemetry, so skip the ack round-trip
+        coll = get_mongo_client()[MONGO_DB].get_collection(
+            MONGO_COLLECTION, write_concern=WriteConcern(w=0)
+        )
+        _metadata_flusher = asyncio.create_task(flush_metadata(coll))
+    try:
+        _metadata_queue.put_nowait(doc)
+    except asyncio.QueueFull:
+        # Mongo is falling behind; shed telemetry instead of growing memory
+        logger.warning("⚠️ Metadata queue full — dropping doc for %s", doc.get("filename"))
+
+
+async def flush_metadata(coll) -> None:
+    """Drain queued metadata docs into MongoDB, one insert_many per batch."""
+    global _metadata_batch
+    loop = asyncio.get_running_loop()
+    while True:
+        _metadata_batch = batch = [await _metadata_queue.get()]
+        deadline = loop.time() + METADATA_FLUSH_INTERVAL
+        while len(batch) < METADATA_FLUSH_BATCH:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(_metadata_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            await coll.insert_many(batch, ordered=False)
+            logger.info("✅ Inserted %d metadata docs into MongoDB.", len(batch))
+        except Exception as mongo_err:
+            logger.error("⚠️ MongoDB insert failed for %d docs: %s", len(batch), mongo_err)
+            logger.debug("Traceback:", exc_info=True)
+        _metadata_batch = []
+
+
+@atexit.register
+def flush_metadata_on_exit() -> None:
+    """
+    Write whatever is still buffered when the worker process exits.
+    The event loop is gone by then, so this uses a short-lived synchronous pymongo client.
+    """
+    batch = list(_metadata_batch)
+    while _metadata_queue is not None and not _metadata_queue.empty():
+        batch.append(_metadata_queue.get_nowait())
+    if not batch:
+        return
+
+    try:
+        from pymongo import MongoClient
+        with MongoClient(MONGO_URI, tls=True, tlsAllowInvalidCertificates=True, serverSelectionTimeoutMS=5000) as client:
+            client[MONGO_DB][MONGO_COLLECTION].insert_many(batch, ordered=False)
+        logger.info("✅ Flushed %d metadata docs into MongoDB on shutdown.", len(batch))
+    except Exception as mongo_err:
+        logger.error("⚠️ MongoDB shutdown flush failed for %d docs: %s", len(batch), mongo_err)
@@ -0,0 +1,34 @@
+"""
+Environment-driven settings and helpers shared by the Function app's modules.
+"""
+
+import logging
+import os
+
+
+def env_flag(name: str, default: str = "1") -> bool:
+    """Read an on/off feature flag from the environment."""
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Max files from one Upload_image request uploaded at the same time
+UPLOAD_FANOUT = int(os.getenv("UPLOAD_FANOUT", "8"))
+
+
+# -----------------------
+# Logging (the Functions host owns the root logger and its handlers)
+# -----------------------
+APP_LOGGER_NAME = "pazofunc"  # parent of every Function and shared_code logger
+
+app_logger = logging.getLogger(APP_LOGGER_NAME)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+if isinstance(logging.getLevelName(LOG_LEVEL), int):
+    app_logger.setLevel(LOG_LEVEL)
+else:
+    app_logger.setLevel(logging.INFO)
+    app_logger.warning("⚠️ Invalid LOG_LEVEL=%r; falling back to INFO.", LOG_LEVEL)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a child of the app logger, so LOG_LEVEL applies to it."""
+    return logging.getLogger(f"{APP_LOGGER_NAME}.{name}")